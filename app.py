@@ -1,31 +1,363 @@
 import streamlit as st
 import snowflake.connector
+from snowflake.connector.errors import NotSupportedError
 import pandas as pd
-import json
+import orjson
 import os
+import asyncio
+import random
+import threading
+import time
+import datetime as datetime_module
 from datetime import datetime
-import copy
-from typing import Dict, List, Any, Optional
+from decimal import Decimal
+from typing import Dict, List, Any, Iterator, Optional
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import anthropic
-from openai import OpenAI
+import openai
+from openai import OpenAI, AsyncOpenAI
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.backends import default_backend
 
 from dotenv import load_dotenv
 load_dotenv()
 
-def convert_decimals(obj):
-    """Convert Decimal, date, and datetime objects for JSON serialization"""
-    import datetime
-    if isinstance(obj, dict):
-        return {k: convert_decimals(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_decimals(v) for v in obj]
-    elif hasattr(obj, '__class__') and obj.__class__.__name__ == 'Decimal':
+# Newline for joins inside f-string expressions, which cannot contain backslashes
+_NL = "\n"
+
+# Canned responses used instead of LLM calls when a query or batch returned no rows
+EMPTY_RESULT_ANALYSIS = "Query returned no results; consider relaxing filters or checking the joined tables."
+EMPTY_BATCH_SUMMARY = "No substantive results in this batch."
+
+# Concurrent DESCRIBE TABLE calls issued when bulk column discovery is unavailable
+DESCRIBE_WORKERS = 16
+
+# LLM request pacing and retry policy (SDK-level retries are disabled in favour of these).
+# Default requests-per-minute budgets per provider; override with the LLM_RPM env var.
+LLM_REQUESTS_PER_MINUTE = {"anthropic": 50, "openai": 500}
+LLM_MAX_ATTEMPTS = 5
+LLM_BACKOFF_MAX_SECONDS = 30
+# Status errors are filtered by _is_retryable, matching the SDKs' own policy (e.g. Anthropic 529 overloaded)
+RETRYABLE_LLM_ERRORS = (
+    anthropic.APIConnectionError, anthropic.APIStatusError,
+    openai.APIConnectionError, openai.APIStatusError,
+)
+RETRYABLE_STATUS_CODES = (408, 409, 429)
+
+def _json_default(obj):
+    """orjson fallback for Decimal and datetime subclasses it does not serialize natively"""
+    if isinstance(obj, Decimal):
         return float(obj)
-    elif isinstance(obj, (datetime.datetime, datetime.date)):
-        return obj.isoformat()
-    elif isinstance(obj, datetime.time):
+    elif isinstance(obj, (datetime_module.datetime, datetime_module.date, datetime_module.time)):
         return obj.isoformat()
-    return obj
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def _jdumps_bytes(obj) -> bytes:
+    """Serialize to indented UTF-8 JSON bytes using orjson, for download payloads"""
+    return orjson.dumps(obj, default=_json_default, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+
+def _jdumps(obj) -> str:
+    """Serialize prompts and artifacts as indented JSON using orjson"""
+    return _jdumps_bytes(obj).decode()
+
+def _int_to_jsonable(value):
+    """Stringify ints outside orjson's 64-bit range (NUMBER(38,0) can exceed it); orjson won't call default for them"""
+    if isinstance(value, int) and not -2 ** 63 <= value < 2 ** 64:
+        return str(value)
+    return value
+
+def _df_to_jsonable(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert a result frame to records, casting Decimal columns to float column-wise"""
+    # Timestamps are left to _json_default (isoformat), like every other timestamp in the artifacts
+    out = df.copy()
+    # By position, since joins can return duplicate column labels
+    for i in range(out.shape[1]):
+        column = out.iloc[:, i]
+        if column.dtype != object:
+            continue
+        # Snowflake columns are homogeneous, so the first non-null value identifies Decimal columns
+        non_null = column.dropna()
+        if non_null.empty:
+            continue
+        if isinstance(non_null.iloc[0], Decimal):
+            out.isetitem(i, column.astype(float))
+        elif isinstance(non_null.iloc[0], int):
+            out.isetitem(i, column.map(_int_to_jsonable))
+    return out.to_dict('records')
+
+def _sql_preview(sql: str, width: int = 80) -> str:
+    """First line of a query that isn't blank or a -- comment, truncated for display"""
+    for line in (sql or "").splitlines():
+        line = line.strip()
+        if line and not line.startswith("--"):
+            return line[:width]
+    return ""
+
+@st.cache_resource(show_spinner=False, validate=lambda conn: not conn.is_closed())
+def _get_snowflake_conn(params_tuple):
+    """Open (or reuse) a Snowflake connection for the given hashable connection params"""
+    return snowflake.connector.connect(**dict(params_tuple))
+
+class IntrospectionError(Exception):
+    """Fatal schema introspection failure carrying the artifact error record"""
+
+    def __init__(self, message: str, error_info: Dict[str, Any]):
+        super().__init__(message)
+        self.error_info = error_info
+
+def _describe_table(conn, table_name: str) -> List[Dict[str, Any]]:
+    """Fetch column metadata for one table on its own cursor (safe to call from worker threads)"""
+    cursor = conn.cursor()
+    try:
+        # DESCRIBE TABLE: the per-table fallback when the bulk INFORMATION_SCHEMA query fails
+        cursor.execute(f"DESCRIBE TABLE {table_name}")
+        columns_result = cursor.fetchall()
+        
+        # DESCRIBE TABLE usually returns: name, type, kind, null?, default, primary key, unique key, check, expression, comment
+        columns = []
+        for col_row in columns_result:
+            columns.append({
+                "name": col_row[0],  # Column name
+                "type": col_row[1],  # Data type
+                "nullable": col_row[3] == "Y",  # Nullable
+                "is_identity": False  # Can't easily determine from DESCRIBE
+            })
+        return columns
+    finally:
+        cursor.close()
+
+def _describe_style_type(data_type: str, char_length, precision, scale, datetime_precision) -> str:
+    """Rebuild DESCRIBE TABLE's type string (e.g. NUMBER(38,2), VARCHAR(16777216)) from INFORMATION_SCHEMA.COLUMNS"""
+    if data_type == "NUMBER" and precision is not None:
+        return f"NUMBER({precision},{scale or 0})"
+    if data_type == "TEXT":
+        return f"VARCHAR({char_length})" if char_length is not None else "VARCHAR"
+    if data_type == "BINARY" and char_length is not None:
+        return f"BINARY({char_length})"
+    if (data_type == "TIME" or data_type.startswith("TIMESTAMP")) and datetime_precision is not None:
+        return f"{data_type}({datetime_precision})"
+    return data_type
+
+def _describe_tables(conn, table_names: List[str], errors: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Fallback column discovery: fan one DESCRIBE TABLE per table out in parallel"""
+    columns_by_table = {}
+    with ThreadPoolExecutor(max_workers=DESCRIBE_WORKERS) as executor:
+        futures = {executor.submit(_describe_table, conn, table_name): table_name for table_name in table_names}
+        for future in as_completed(futures):
+            table_name = futures[future]
+            try:
+                columns_by_table[table_name] = future.result()
+            except Exception as e:
+                # Add table with empty columns rather than failing completely
+                columns_by_table[table_name] = []
+                errors.append({
+                    "error_type": "COLUMN_DISCOVERY_ERROR",
+                    "error_message": str(e),
+                    "table_name": table_name
+                })
+    return columns_by_table
+
+@st.cache_data(ttl="1h", show_spinner=False)
+def _introspect(_conn, account: str, database: str, schema: str) -> Dict[str, Any]:
+    """Discover tables, columns and inferred relationships, cached per (account, database, schema).
+
+    Performs no Streamlit output so cache hits skip every Snowflake round-trip;
+    the caller renders the returned diagnostics. Non-fatal column discovery
+    errors are returned under "errors".
+    """
+    cursor = _conn.cursor()
+    try:
+        # Check current database and schema
+        cursor.execute("SELECT CURRENT_DATABASE(), CURRENT_SCHEMA(), CURRENT_WAREHOUSE()")
+        current_context = list(cursor.fetchone())
+        
+        # Get available databases
+        cursor.execute("SHOW DATABASES")
+        available_dbs = [db[1] for db in cursor.fetchall()]
+        
+        # Try to set the database context
+        try:
+            cursor.execute(f"USE DATABASE {database}")
+        except Exception as e:
+            raise IntrospectionError(f"Failed to set database {database}: {e}", {
+                "error_type": "DATABASE_ACCESS_ERROR",
+                "error_message": str(e),
+                "requested_database": database,
+                "available_databases": available_dbs
+            })
+        
+        # Check available schemas in this database
+        cursor.execute("SHOW SCHEMAS")
+        available_schemas = [sch[1] for sch in cursor.fetchall()]
+        
+        # Try to set the schema
+        try:
+            cursor.execute(f"USE SCHEMA {schema}")
+        except Exception as e:
+            raise IntrospectionError(f"Failed to set schema {schema}: {e}", {
+                "error_type": "SCHEMA_ACCESS_ERROR",
+                "error_message": str(e),
+                "requested_schema": schema,
+                "available_schemas": available_schemas
+            })
+        
+        # Now try to get tables - using a more basic approach
+        show_tables_error = None
+        try:
+            # Try the simpler SHOW TABLES approach first; TERSE skips per-table row/byte statistics
+            cursor.execute("SHOW TERSE TABLES")
+            tables_result = cursor.fetchall()
+            table_source = "SHOW TERSE TABLES"
+            
+            # Convert SHOW TABLES result to our expected format
+            tables = [(row[1], 'BASE TABLE') for row in tables_result]  # Table name is usually in column 1
+            
+        except Exception as e:
+            show_tables_error = str(e)
+            # Fallback to INFORMATION_SCHEMA if available
+            try:
+                cursor.execute("""
+                    SELECT table_name, table_type
+                    FROM INFORMATION_SCHEMA.TABLES
+                    WHERE table_schema = CURRENT_SCHEMA()
+                    AND table_type IN ('BASE TABLE', 'VIEW')
+                """)
+                tables = cursor.fetchall()
+                table_source = "INFORMATION_SCHEMA"
+            except Exception as e2:
+                raise IntrospectionError(f"Both SHOW TABLES and INFORMATION_SCHEMA queries failed: {e2}", {
+                    "error_type": "TABLE_DISCOVERY_ERROR",
+                    "error_message": str(e2),
+                    "show_tables_error": str(e),
+                    "information_schema_error": str(e2)
+                })
+        
+        schema_dict = {"tables": {}, "relationships": []}
+        errors = []
+        
+        # Get column information for every table in one INFORMATION_SCHEMA round-trip
+        try:
+            cursor.execute("""
+                SELECT table_name, column_name, data_type, is_nullable, is_identity,
+                       character_maximum_length, numeric_precision, numeric_scale, datetime_precision
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE table_schema = CURRENT_SCHEMA()
+                ORDER BY table_name, ordinal_position
+            """)
+            columns_by_table = defaultdict(list)
+            for (table_name, column_name, data_type, is_nullable, is_identity,
+                 char_length, precision, scale, datetime_precision) in cursor.fetchall():
+                columns_by_table[table_name].append({
+                    "name": column_name,
+                    # Same type format as the DESCRIBE TABLE fallback, keeping precision/scale/length
+                    "type": _describe_style_type(data_type, char_length, precision, scale, datetime_precision),
+                    "nullable": is_nullable == "YES",
+                    "is_identity": is_identity == "YES"
+                })
+            column_source = "INFORMATION_SCHEMA"
+        except Exception as e:
+            errors.append({
+                "error_type": "BULK_COLUMN_DISCOVERY_ERROR",
+                "error_message": str(e)
+            })
+            columns_by_table = _describe_tables(_conn, [table_name for table_name, _ in tables], errors)
+            column_source = "DESCRIBE TABLE"
+        
+        for table_name, table_type in tables:
+            schema_dict["tables"][table_name] = {
+                "type": table_type,
+                "columns": columns_by_table.get(table_name, [])
+            }
+        
+        # Try to infer relationships from naming conventions
+        existing_tables = {t.lower() for t in schema_dict["tables"]}
+        for table_name, table_info in schema_dict["tables"].items():
+            for column in table_info["columns"]:
+                # Look for potential foreign keys (e.g., user_id that might reference users.id)
+                column_name = column["name"].lower()
+                if not column_name.endswith("_id"):
+                    continue
+                
+                # Check if the target table exists (singular or plural)
+                potential_table = column_name[:-3]
+                if potential_table in existing_tables:
+                    target_table = potential_table
+                elif f"{potential_table}s" in existing_tables:
+                    target_table = f"{potential_table}s"
+                else:
+                    continue
+                
+                schema_dict["relationships"].append({
+                    "source_table": table_name,
+                    "source_column": column["name"],
+                    "target_table": target_table,
+                    "inferred": True
+                })
+        
+        return {
+            "context": current_context,
+            "available_databases": available_dbs,
+            "available_schemas": available_schemas,
+            "table_source": table_source,
+            "column_source": column_source,
+            "show_tables_error": show_tables_error,
+            "schema": schema_dict,
+            "errors": errors
+        }
+        
+    finally:
+        cursor.close()
+
+class _TokenBucket:
+    """Thread-safe token bucket pacing LLM requests ahead of provider rate limits"""
+    
+    def __init__(self, requests_per_minute: float, burst: int = 5):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self) -> float:
+        """Take one token and return how many seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+@st.cache_resource(show_spinner=False)
+def _get_rate_limiter(provider: str) -> _TokenBucket:
+    """Process-wide token bucket per provider, shared by every LLMClient and session"""
+    configured = os.getenv('LLM_RPM')
+    if not configured:
+        return _TokenBucket(LLM_REQUESTS_PER_MINUTE[provider])
+    try:
+        requests_per_minute = float(configured)
+    except ValueError:
+        requests_per_minute = 0.0
+    # A zero or negative rate would make the bucket divide by zero once the burst is spent
+    if not requests_per_minute > 0:
+        raise ValueError(f"LLM_RPM must be a positive number of requests per minute, got {configured!r}")
+    return _TokenBucket(requests_per_minute)
+
+def _is_retryable(error: Exception) -> bool:
+    """True for connection errors and 408/409/429/5xx responses"""
+    status_code = getattr(error, "status_code", None)
+    return status_code is None or status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+
+def _backoff_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """Delay before the next retry: the server's Retry-After if given, else exponential backoff with jitter"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        if retry_after is not None:
+            return min(LLM_BACKOFF_MAX_SECONDS, max(0.0, float(retry_after)))
+    except ValueError:
+        pass  # HTTP-date form; fall back to backoff
+    return min(LLM_BACKOFF_MAX_SECONDS, 2 ** attempt) + random.uniform(0, 1)
 
 class LLMClient:
     """Unified LLM client supporting multiple providers"""
@@ -37,46 +369,156 @@ class LLMClient:
             api_key = os.getenv('ANTHROPIC_API_KEY')
             if not api_key:
                 raise ValueError("ANTHROPIC_API_KEY environment variable is required")
-            self.client = anthropic.Anthropic(api_key=api_key)
+            self.client = anthropic.Anthropic(api_key=api_key, max_retries=0)
+            self.async_client_cls = anthropic.AsyncAnthropic
             self.model = "claude-sonnet-4-20250514"
         
         elif self.provider == "openai":
             api_key = os.getenv('OPENAI_API_KEY')
             if not api_key:
                 raise ValueError("OPENAI_API_KEY environment variable is required")
-            self.client = OpenAI(api_key=api_key)
+            self.client = OpenAI(api_key=api_key, max_retries=0)
+            self.async_client_cls = AsyncOpenAI
             self.model = "gpt-4o"
         
         else:
             raise ValueError(f"Unsupported provider: {provider}")
+        
+        self.api_key = api_key
+        self.throttle = _get_rate_limiter(self.provider)
+    
+    def _create(self, prompt: str, max_tokens: int) -> str:
+        """Issue a single completion request"""
+        if self.provider == "anthropic":
+            response = self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            return response.content[0].text
+        
+        elif self.provider == "openai":
+            response = self.client.chat.completions.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            return response.choices[0].message.content
+    
+    async def _acreate(self, aclient, prompt: str, max_tokens: int) -> str:
+        """Issue a single completion request on an async client"""
+        if self.provider == "anthropic":
+            response = await aclient.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            return response.content[0].text
+        
+        elif self.provider == "openai":
+            response = await aclient.chat.completions.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            return response.choices[0].message.content
     
     def generate(self, prompt: str, max_tokens: int = 4000) -> str:
-        """Generate response using the configured provider"""
+        """Generate response using the configured provider, retrying transient failures"""
         try:
-            if self.provider == "anthropic":
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-                return response.content[0].text
-            
-            elif self.provider == "openai":
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-                return response.choices[0].message.content
+            for attempt in range(LLM_MAX_ATTEMPTS):
+                time.sleep(self.throttle.reserve())
+                try:
+                    return self._create(prompt, max_tokens)
+                except RETRYABLE_LLM_ERRORS as e:
+                    if not _is_retryable(e) or attempt == LLM_MAX_ATTEMPTS - 1:
+                        raise
+                    time.sleep(_backoff_delay(attempt, e))
                 
         except Exception as e:
             return f"Error generating response: {str(e)}"
+    
+    async def agenerate(self, aclient, prompt: str, max_tokens: int = 4000) -> str:
+        """Async counterpart of generate, using an async client opened by generate_many"""
+        try:
+            for attempt in range(LLM_MAX_ATTEMPTS):
+                await asyncio.sleep(self.throttle.reserve())
+                try:
+                    return await self._acreate(aclient, prompt, max_tokens)
+                except RETRYABLE_LLM_ERRORS as e:
+                    if not _is_retryable(e) or attempt == LLM_MAX_ATTEMPTS - 1:
+                        raise
+                    await asyncio.sleep(_backoff_delay(attempt, e))
+                
+        except Exception as e:
+            return f"Error generating response: {str(e)}"
+    
+    def _stream_chunks(self, prompt: str, max_tokens: int) -> Iterator[str]:
+        """Yield response text as the provider streams it"""
+        if self.provider == "anthropic":
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                yield from stream.text_stream
+        
+        elif self.provider == "openai":
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+    
+    def stream(self, prompt: str, max_tokens: int = 4000) -> Iterator[str]:
+        """Streaming counterpart of generate; retries only before the first chunk arrives
+
+        Unlike generate, failures are raised rather than returned as text, so error
+        messages can never be mistaken for (and spliced into) the streamed output.
+        """
+        for attempt in range(LLM_MAX_ATTEMPTS):
+            time.sleep(self.throttle.reserve())
+            started = False
+            try:
+                for text in self._stream_chunks(prompt, max_tokens):
+                    started = True
+                    yield text
+                return
+            except RETRYABLE_LLM_ERRORS as e:
+                if started or not _is_retryable(e) or attempt == LLM_MAX_ATTEMPTS - 1:
+                    raise
+                time.sleep(_backoff_delay(attempt, e))
+    
+    def generate_many(self, prompts: List[str], max_tokens: int = 4000, max_concurrency: int = 10) -> List[str]:
+        """Generate responses for independent prompts concurrently, preserving order"""
+        async def _bounded(semaphore, aclient, prompt):
+            async with semaphore:
+                return await self.agenerate(aclient, prompt, max_tokens)
+        
+        async def _gather():
+            # Semaphores and async HTTP pools are bound to their event loop, so create them per run
+            semaphore = asyncio.Semaphore(max_concurrency)
+            async with self.async_client_cls(api_key=self.api_key, max_retries=0) as aclient:
+                return await asyncio.gather(*(_bounded(semaphore, aclient, prompt) for prompt in prompts))
+        
+        if not prompts:
+            return []
+        return asyncio.run(_gather())
+
+@st.cache_resource(show_spinner=False)
+def get_llm_client(provider: str) -> LLMClient:
+    """Shared LLMClient per provider, so SDK connection pools survive reruns and sessions"""
+    return LLMClient(provider)
 
 class StreamlitDataTwin:
     """Enhanced DataTwin with hierarchical summarization"""
     
     def __init__(self, llm_provider: str = "anthropic", max_queries: int = 7):
-        self.llm_client = LLMClient(llm_provider)
+        self.llm_client = get_llm_client(llm_provider)
         self.max_queries = max_queries
         self.query_count = 0
         self.schema = {}
@@ -91,7 +533,7 @@ class StreamlitDataTwin:
                 "max_queries": max_queries
             },
             "schema": {},
-            "query_history": [],
+            "query_history": self.query_history,  # Shared with self.query_history; entries are append-only
             "findings_history": [],
             "thinking_prompts": [],
             "thinking_responses": [],
@@ -105,10 +547,30 @@ class StreamlitDataTwin:
         # Track current batch for summarization
         self.current_batch_start = 1
     
+    def set_llm_provider(self, llm_provider: str):
+        """Swap the LLM client, keeping the introspected schema and exploration artifacts"""
+        self.llm_client = get_llm_client(llm_provider)
+        self.artifacts["session_metadata"]["llm_provider"] = llm_provider
+    
+    @property
+    def introspected_schema(self) -> Dict[str, Any]:
+        """Full schema from introspection, unaffected by table-selection filtering"""
+        return self.artifacts["schema"].get("schema_data", self.schema)
+    
+    @property
+    def schema(self) -> Dict[str, Any]:
+        return self._schema
+    
+    @schema.setter
+    def schema(self, value: Dict[str, Any]):
+        # Serialize once per assignment rather than on every prompt; replace the dict, don't mutate it
+        self._schema = value
+        self._schema_json = _jdumps(value)
+    
     def connect_snowflake(self, connection_params: Dict[str, str]):
-        """Connect to Snowflake with error handling"""
+        """Connect to Snowflake with error handling, reusing a cached connection across reruns"""
         try:
-            conn = snowflake.connector.connect(**connection_params)
+            conn = _get_snowflake_conn(tuple(sorted(connection_params.items())))
             return conn
         except Exception as e:
             error_info = {
@@ -122,185 +584,56 @@ class StreamlitDataTwin:
     
     def introspect_schema(self, conn):
         """Introspect database schema with artifact capture and enhanced debugging"""
-        cursor = conn.cursor()
         try:
-            # First, let's see what's available to us
-            st.write("🔍 Checking current session context...")
-            
-            # Check current database and schema
-            cursor.execute("SELECT CURRENT_DATABASE(), CURRENT_SCHEMA(), CURRENT_WAREHOUSE()")
-            current_context = cursor.fetchone()
-            st.info(f"Current context - Database: {current_context[0]}, Schema: {current_context[1]}, Warehouse: {current_context[2]}")
-            
-            # Get available databases
-            cursor.execute("SHOW DATABASES")
-            databases = cursor.fetchall()
-            available_dbs = [db[1] for db in databases]
-            st.write(f"📊 Available databases: {available_dbs}")
-            
             # Get connection parameters from environment
+            account = os.getenv('SNOWFLAKE_ACCOUNT')
             database = os.getenv('SNOWFLAKE_DATABASE')
             schema = os.getenv('SNOWFLAKE_SCHEMA')
             
+            st.write("🔍 Checking current session context...")
             st.write(f"🎯 Attempting to use database: {database}, schema: {schema}")
             
-            # Try to set the database context
             try:
-                cursor.execute(f"USE DATABASE {database}")
-                st.success(f"✅ Successfully set database to {database}")
-            except Exception as e:
-                error_msg = f"Failed to set database {database}: {e}"
-                st.error(error_msg)
-                st.write(f"Available databases: {available_dbs}")
+                result = _introspect(conn, account, database, schema)
+            except IntrospectionError as e:
+                st.error(str(e))
+                if "available_databases" in e.error_info:
+                    st.write(f"Available databases: {e.error_info['available_databases']}")
                 
                 # Store error in artifacts
-                error_info = {
-                    "timestamp": datetime.now().isoformat(),
-                    "error_type": "DATABASE_ACCESS_ERROR",
-                    "error_message": str(e),
-                    "requested_database": database,
-                    "available_databases": available_dbs
-                }
-                self.artifacts["errors"].append(error_info)
-                raise Exception(error_msg)
+                self.artifacts["errors"].append({"timestamp": datetime.now().isoformat(), **e.error_info})
+                raise Exception(str(e))
             
-            # Check available schemas in this database
-            cursor.execute("SHOW SCHEMAS")
-            schemas = cursor.fetchall()
-            available_schemas = [sch[1] for sch in schemas]
-            st.write(f"📋 Available schemas in {database}: {available_schemas}")
-            
-            # Try to set the schema
-            try:
-                cursor.execute(f"USE SCHEMA {schema}")
-                st.success(f"✅ Successfully set schema to {schema}")
-            except Exception as e:
-                error_msg = f"Failed to set schema {schema}: {e}"
-                st.error(error_msg)
-                
-                # Store error in artifacts
-                error_info = {
-                    "timestamp": datetime.now().isoformat(),
-                    "error_type": "SCHEMA_ACCESS_ERROR",
-                    "error_message": str(e),
-                    "requested_schema": schema,
-                    "available_schemas": available_schemas
-                }
-                self.artifacts["errors"].append(error_info)
-                raise Exception(error_msg)
+            current_context = result["context"]
+            st.info(f"Current context - Database: {current_context[0]}, Schema: {current_context[1]}, Warehouse: {current_context[2]}")
+            st.write(f"📊 Available databases: {result['available_databases']}")
+            st.success(f"✅ Successfully set database to {database}")
+            st.write(f"📋 Available schemas in {database}: {result['available_schemas']}")
+            st.success(f"✅ Successfully set schema to {schema}")
             
-            # Now try to get tables - using a more basic approach
-            try:
-                # Try the simpler SHOW TABLES approach first
-                cursor.execute("SHOW TABLES")
-                tables_result = cursor.fetchall()
-                st.success(f"📊 Found {len(tables_result)} tables using SHOW TABLES")
-                
-                # Convert SHOW TABLES result to our expected format
-                tables = [(row[1], 'BASE TABLE') for row in tables_result]  # Table name is usually in column 1
-                
-            except Exception as e:
-                st.warning(f"SHOW TABLES failed: {e}")
-                # Fallback to INFORMATION_SCHEMA if available
-                try:
-                    cursor.execute("""
-                        SELECT table_name, table_type
-                        FROM INFORMATION_SCHEMA.TABLES
-                        WHERE table_schema = CURRENT_SCHEMA()
-                        AND table_type IN ('BASE TABLE', 'VIEW')
-                    """)
-                    tables = cursor.fetchall()
-                    st.success(f"📊 Found {len(tables)} tables using INFORMATION_SCHEMA")
-                except Exception as e2:
-                    error_msg = f"Both SHOW TABLES and INFORMATION_SCHEMA queries failed: {e2}"
-                    st.error(error_msg)
-                    
-                    # Store error in artifacts
-                    error_info = {
-                        "timestamp": datetime.now().isoformat(),
-                        "error_type": "TABLE_DISCOVERY_ERROR",
-                        "error_message": str(e2),
-                        "show_tables_error": str(e),
-                        "information_schema_error": str(e2)
-                    }
-                    self.artifacts["errors"].append(error_info)
-                    raise Exception(error_msg)
+            if result["show_tables_error"]:
+                st.warning(f"SHOW TABLES failed: {result['show_tables_error']}")
             
-            if tables:
-                table_names = [table[0] for table in tables[:5]]
-                st.write(f"📋 Table names (first 5): {table_names}...")
-                if len(tables) > 5:
-                    st.write(f"... and {len(tables) - 5} more tables")
+            schema_dict = result["schema"]
+            table_names = list(schema_dict["tables"].keys())
+            st.success(f"📊 Found {len(table_names)} tables using {result['table_source']}")
             
-            schema_dict = {"tables": {}, "relationships": []}
+            if table_names:
+                st.write(f"📋 Table names (first 5): {table_names[:5]}...")
+                if len(table_names) > 5:
+                    st.write(f"... and {len(table_names) - 5} more tables")
             
-            # Get column information for each table
-            progress_bar = st.progress(0)
-            for i, (table_name, table_type) in enumerate(tables):
-                progress_bar.progress((i + 1) / len(tables))
-                st.write(f"🔍 Getting columns for table: {table_name}")
+            for error in result["errors"]:
+                if "table_name" in error:
+                    st.warning(f"⚠️ Failed to get columns for table {error['table_name']}: {error['error_message']}")
+                else:
+                    st.warning(f"⚠️ Bulk column discovery failed, fell back to DESCRIBE TABLE: {error['error_message']}")
                 
-                try:
-                    # Try DESCRIBE TABLE first (more universally supported)
-                    cursor.execute(f"DESCRIBE TABLE {table_name}")
-                    columns_result = cursor.fetchall()
-                    
-                    # DESCRIBE TABLE usually returns: name, type, kind, null?, default, primary key, unique key, check, expression, comment
-                    columns = []
-                    for col_row in columns_result:
-                        columns.append({
-                            "name": col_row[0],  # Column name
-                            "type": col_row[1],  # Data type
-                            "nullable": col_row[3] == "Y",  # Nullable
-                            "is_identity": False  # Can't easily determine from DESCRIBE
-                        })
-                    
-                    schema_dict["tables"][table_name] = {
-                        "type": table_type,
-                        "columns": columns
-                    }
-                    
-                except Exception as e:
-                    st.warning(f"⚠️ Failed to get columns for table {table_name}: {e}")
-                    # Add table with empty columns rather than failing completely
-                    schema_dict["tables"][table_name] = {
-                        "type": table_type,
-                        "columns": []
-                    }
-                    
-                    # Store error in artifacts
-                    error_info = {
-                        "timestamp": datetime.now().isoformat(),
-                        "error_type": "COLUMN_DISCOVERY_ERROR",
-                        "error_message": str(e),
-                        "table_name": table_name
-                    }
-                    self.artifacts["errors"].append(error_info)
-            
-            progress_bar.empty()
-            
-            # Try to infer relationships from naming conventions
-            relationship_count = 0
-            for table_name, table_info in schema_dict["tables"].items():
-                for column in table_info["columns"]:
-                    # Look for potential foreign keys (e.g., user_id that might reference users.id)
-                    if "_id" in column["name"].lower():
-                        # Extract the potential target table name
-                        potential_table = column["name"].lower().replace("_id", "")
-                        # Check if the table exists (singular or plural)
-                        existing_tables = [t.lower() for t in schema_dict["tables"].keys()]
-                        if potential_table in existing_tables or f"{potential_table}s" in existing_tables:
-                            target_table = potential_table if potential_table in existing_tables else f"{potential_table}s"
-                            schema_dict["relationships"].append({
-                                "source_table": table_name,
-                                "source_column": column["name"],
-                                "target_table": target_table,
-                                "inferred": True
-                            })
-                            relationship_count += 1
+                # Store error in artifacts
+                self.artifacts["errors"].append({"timestamp": datetime.now().isoformat(), **error})
             
-            if relationship_count > 0:
-                st.success(f"🔗 Inferred {relationship_count} potential relationships")
+            if schema_dict["relationships"]:
+                st.success(f"🔗 Inferred {len(schema_dict['relationships'])} potential relationships")
             
             # Store complete schema in artifacts
             self.artifacts["schema"] = {
@@ -309,7 +642,8 @@ class StreamlitDataTwin:
                 "relationship_count": len(schema_dict["relationships"]),
                 "schema_data": schema_dict,
                 "database_used": database,
-                "schema_used": schema
+                "schema_used": schema,
+                "column_source": result["column_source"]
             }
             
             self.schema = schema_dict
@@ -330,16 +664,9 @@ class StreamlitDataTwin:
             }
             self.artifacts["errors"].append(error_info)
             raise e
-            
-        finally:
-            cursor.close()
     
-    # Hierarchical summarization function
-    def generate_hierarchical_summary(self, batch_queries: List[Dict]) -> str:
-        """Generate structured summary of a batch of queries"""
-        if not batch_queries:
-            return ""
-        
+    def _build_summary_prompt(self, batch_queries: List[Dict]) -> str:
+        """Build the structured summary prompt for a batch of queries"""
         # Extract key facts from query results
         factual_anchors = []
         for query in batch_queries:
@@ -356,10 +683,10 @@ class StreamlitDataTwin:
                 if fact_summary != f"Q{query['query_num']}: ":
                     factual_anchors.append(fact_summary.rstrip(', '))
             
-        summary_prompt = f"""Based on queries {batch_queries[0]['query_num']} through {batch_queries[-1]['query_num']}, create a structured summary:
+        return f"""Based on queries {batch_queries[0]['query_num']} through {batch_queries[-1]['query_num']}, create a structured summary:
 
 CRITICAL: Use these exact numerical facts as anchors for accuracy:
-{chr(10).join(factual_anchors)}
+{_NL.join(factual_anchors)}
         
 ## TABLE INSIGHTS
 For each table explored:
@@ -383,25 +710,53 @@ For each table explored:
 - Questions raised for future exploration
 
 Previous queries in this batch:
-{json.dumps([f"Q{q['query_num']}: {q['sql'][:100]}... -> {q['result_summary']}" for q in batch_queries], indent=2)}
+{_jdumps([f"Q{q['query_num']}: {q['sql'][:100]}... -> {q['result_summary']}" for q in batch_queries])}
 
 Format as structured text with clear headers, not bullet points. Be concise but comprehensive."""
+    
+    def _record_summary_prompt(self, batch_queries: List[Dict], summary_prompt: str):
+        """Store the summary generation prompt for debugging"""
+        self.artifacts["thinking_prompts"].append({
+            "query_num": f"SUMMARY_{batch_queries[0]['query_num']}-{batch_queries[-1]['query_num']}",
+            "timestamp": datetime.now().isoformat(),
+            "thinking_prompt": summary_prompt,
+            "type": "hierarchical_summary"
+        })
+    
+    @staticmethod
+    def _is_empty_batch(batch_queries: List[Dict]) -> bool:
+        """True when no query in the batch returned rows, so there is nothing to summarize"""
+        return all(q.get('row_count', 0) == 0 for q in batch_queries)
+    
+    # Hierarchical summarization function
+    def generate_hierarchical_summary(self, batch_queries: List[Dict]) -> str:
+        """Generate structured summary of a batch of queries"""
+        if not batch_queries:
+            return ""
+        if self._is_empty_batch(batch_queries):
+            return EMPTY_BATCH_SUMMARY
+        
+        summary_prompt = self._build_summary_prompt(batch_queries)
         
         try:
             summary = self.llm_client.generate(summary_prompt)
-            
-            # Store the summary generation prompt for debugging
-            self.artifacts["thinking_prompts"].append({
-                "query_num": f"SUMMARY_{batch_queries[0]['query_num']}-{batch_queries[-1]['query_num']}",
-                "timestamp": datetime.now().isoformat(),
-                "thinking_prompt": summary_prompt,
-                "type": "hierarchical_summary"
-            })
-            
+            self._record_summary_prompt(batch_queries, summary_prompt)
             return summary
         except Exception as e:
             return f"Error generating summary: {str(e)}"
     
+    def summarize_batches(self, batches: List[List[Dict]]) -> List[str]:
+        """Summarize several independent batches concurrently (rate-limited by the LLM client)"""
+        batches = [batch for batch in batches if batch]
+        to_generate = [batch for batch in batches if not self._is_empty_batch(batch)]
+        prompts = [self._build_summary_prompt(batch) for batch in to_generate]
+        generated = iter(self.llm_client.generate_many(prompts))
+        
+        for batch, summary_prompt in zip(to_generate, prompts):
+            self._record_summary_prompt(batch, summary_prompt)
+        
+        return [EMPTY_BATCH_SUMMARY if self._is_empty_batch(batch) else next(generated) for batch in batches]
+    
     def generate_llm_prompt(self) -> str:
         """Generate exploration prompt with hierarchical context"""
         prompt = f"""You are an expert data analyst exploring a database to understand its structure, content, and blind spots.
@@ -409,7 +764,7 @@ Format as structured text with clear headers, not bullet points. Be concise but
 You have run {len(self.query_history)} queries so far, and can run up to {self.max_queries} total queries.
 
 DATABASE SCHEMA:
-{json.dumps(self.schema, indent=2)}
+{self._schema_json}
 
 EXPLORATION HISTORY:"""
         
@@ -421,17 +776,17 @@ EXPLORATION HISTORY:"""
                 prompt += f"""
 
 === PREVIOUS INSIGHTS (SUMMARIZED) ===
-{chr(10).join([f"Batch {i+1}: {summary['summary_content']}" for i, summary in enumerate(self.artifacts["hierarchical_summaries"][-2:])])}
+{_NL.join(f"Batch {i+1}: {summary['summary_content']}" for i, summary in enumerate(self.artifacts["hierarchical_summaries"][-2:]))}
 
 === CURRENT BATCH FINDINGS ===
 Recent findings from current exploration batch:
-{json.dumps(self.findings[-5:], indent=2)}
+{_jdumps(self.findings[-5:])}
 """
             else:
                 # Fallback to current system for first few queries
                 prompt += f"""
 === CURRENT FINDINGS ===
-{json.dumps(self.findings[:10], indent=2)}
+{_jdumps(self.findings[:10])}
 """
             
             # Show recent query history
@@ -474,10 +829,15 @@ Keep SQL concise and efficient."""
         cursor = conn.cursor()
         try:
             cursor.execute(sql)
-            results = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description] if cursor.description else []
-            df = pd.DataFrame(results, columns=columns)
-            return df
+            try:
+                # Arrow-backed fetch builds the DataFrame column-wise without Python row tuples
+                return cursor.fetch_pandas_all()
+            except NotSupportedError:
+                # Non-SELECT results (SHOW, DESCRIBE, ...) are not Arrow-encoded
+                results = cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                df = pd.DataFrame(results, columns=columns)
+                return df
         except Exception as e:
             error_info = {
                 "query_num": self.query_count + 1,
@@ -494,16 +854,22 @@ Keep SQL concise and efficient."""
     def analyze_results(self, df: pd.DataFrame, sql: str) -> str:
         """Analyze query results with enhanced context"""
         if df.empty:
-            summary = "Query returned no results"
-            sample_info = "No data to analyze"
+            # Nothing for the LLM to analyze; record the canned response without a call
+            self.artifacts["thinking_responses"].append({
+                "query_num": self.query_count,
+                "timestamp": datetime.now().isoformat(),
+                "thinking_response": EMPTY_RESULT_ANALYSIS,
+                "skipped_llm_call": True
+            })
+            return EMPTY_RESULT_ANALYSIS
+        
+        summary = f"Returned {len(df)} rows, {len(df.columns)} columns"
+        
+        # Compact CSV sample keeps the prompt (and its token count) small
+        if len(df) <= 10:
+            sample_info = f"All data (CSV):\n{df.to_csv(index=False)}"
         else:
-            summary = f"Returned {len(df)} rows, {len(df.columns)} columns"
-            
-            # Enhanced sample data for analysis
-            if len(df) <= 10:
-                sample_info = f"All data:\n{df.to_string()}"
-            else:
-                sample_info = f"Sample (first 5 rows):\n{df.head().to_string()}\n\nData types:\n{df.dtypes.to_string()}"
+            sample_info = f"Sample (CSV, first 5 rows):\n{df.head().to_csv(index=False)}\nData types: {dict(df.dtypes.astype(str))}"
         
         thinking_prompt = f"""Analyze these SQL results for insights:
 
@@ -524,7 +890,8 @@ Keep it concise."""
             "query_num": self.query_count,
             "timestamp": datetime.now().isoformat(),
             "thinking_prompt": thinking_prompt,
-            "sample_data_included": not df.empty
+            "sample_data_included": True,
+            "estimated_tokens": len(thinking_prompt) // 4  # ~4 characters per token
         })
         
         thinking = self.llm_client.generate(thinking_prompt)
@@ -557,7 +924,7 @@ Keep it concise."""
             "timestamp": datetime.now().isoformat(),
             "new_findings": new_findings_this_query,
             "total_findings_count": len(self.findings),
-            "all_findings_snapshot": copy.deepcopy(self.findings)
+            "all_findings_snapshot": list(self.findings)  # Finding dicts are never mutated, so a shallow copy suffices
         })
     
     # Check if summarization should be triggered
@@ -577,80 +944,153 @@ Keep it concise."""
         batch_queries = self.query_history[-3:]
         summary = self.generate_hierarchical_summary(batch_queries)
         
-        # Store the summary
+        self._store_summary(batch_queries, summary)
+        self.artifacts["summary_trigger_points"].append(self.query_count)
+        
+        # Optional: Reset findings list to prevent context window bloat
+        # Keep only the most recent findings
+        if len(self.findings) > 10:
+            self.findings = self.findings[-5:]  # Keep last 5 findings
+    
+    def _store_summary(self, batch_queries: List[Dict], summary: str, deferred: bool = False):
+        """Append a batch summary to the artifacts"""
         summary_data = {
-            "batch_range": f"queries_{self.query_count-2}_to_{self.query_count}",
+            "batch_range": f"queries_{batch_queries[0]['query_num']}_to_{batch_queries[-1]['query_num']}",
             "timestamp": datetime.now().isoformat(),
             "summary_content": summary,
             "query_count": len(batch_queries),
             "queries_summarized": [q['query_num'] for q in batch_queries]
         }
+        if deferred:
+            summary_data["deferred"] = True
         
         self.artifacts["hierarchical_summaries"].append(summary_data)
-        self.artifacts["summary_trigger_points"].append(self.query_count)
+    
+    def summarize_uncovered_queries(self) -> int:
+        """Summarize full batches that were skipped in-loop (e.g. a failed query fell on a trigger point)"""
+        covered = {num for s in self.artifacts["hierarchical_summaries"] for num in s.get("queries_summarized", [])}
         
-        # Optional: Reset findings list to prevent context window bloat
-        # Keep only the most recent findings
-        if len(self.findings) > 10:
-            self.findings = self.findings[-5:]  # Keep last 5 findings
+        # Split uncovered queries into runs of consecutive query numbers, so a batch never
+        # spans a failed query or an already summarized one
+        runs, run = [], []
+        for q in self.query_history:
+            if q['query_num'] in covered or (run and q['query_num'] != run[-1]['query_num'] + 1):
+                if run:
+                    runs.append(run)
+                run = []
+            if q['query_num'] not in covered:
+                run.append(q)
+        if run:
+            runs.append(run)
+        
+        batches = [r[i:i + 3] for r in runs for i in range(0, len(r) - len(r) % 3, 3)]
+        if not batches:
+            return 0
+        
+        for batch, summary in zip(batches, self.summarize_batches(batches)):
+            self._store_summary(batch, summary, deferred=True)
+        
+        # Keep summaries in query order alongside the in-loop ones
+        self.artifacts["hierarchical_summaries"].sort(key=lambda s: s["queries_summarized"][0])
+        
+        return len(batches)
+    
+    def _generate_and_dispatch(self, conn, prompt: str, executor: ThreadPoolExecutor):
+        """Stream the query-generation response, submitting its SQL as soon as it is complete
+
+        The SQL section is final once "REASONING:" follows "SQL:", so execution overlaps
+        with the rest of the stream. Returns (llm_response, sql_part, df_future); the
+        future is None when the marker never arrived and the SQL must run afterwards.
+        A failed stream raises, so a truncated response never reaches Snowflake.
+        """
+        chunks = []
+        sql_part = None
+        df_future = None
+        try:
+            for text in self.llm_client.stream(prompt):
+                chunks.append(text)
+                if df_future is None:
+                    partial = "".join(chunks)
+                    if "SQL:" in partial and "REASONING:" in partial.split("SQL:", 1)[1]:
+                        sql_part = partial.split("SQL:")[1].split("REASONING:")[0].strip()
+                        df_future = executor.submit(self.execute_query, conn, sql_part)
+        except Exception as e:
+            # Drop any query dispatched from this response; one already running is left to finish unused
+            if df_future is not None:
+                df_future.cancel()
+            raise RuntimeError(f"Error generating response: {str(e)}") from e
+        
+        llm_response = "".join(chunks)
+        if sql_part is None and "SQL:" in llm_response:
+            sql_part = llm_response.split("SQL:")[1].split("REASONING:")[0].strip()
+        return llm_response, sql_part, df_future
     
     def run_exploration(self, conn) -> str:
         """Main exploration loop with hierarchical summarization"""
         results = []
         
-        while self.query_count < self.max_queries:
-            try:
-                self.query_count += 1
-                
-                # Generate next query
-                prompt = self.generate_llm_prompt()
-                llm_response = self.llm_client.generate(prompt)
-                
-                # Parse LLM response
-                if "SQL:" not in llm_response:
-                    results.append(f"Query {self.query_count}: Could not parse LLM response")
+        with ThreadPoolExecutor(max_workers=1) as sql_executor:
+            while self.query_count < self.max_queries:
+                try:
+                    self.query_count += 1
+                    
+                    # Generate next query, dispatching its SQL while the reasoning is still streaming
+                    prompt = self.generate_llm_prompt()
+                    llm_response, sql_part, df_future = self._generate_and_dispatch(conn, prompt, sql_executor)
+                    
+                    # Parse LLM response
+                    if "SQL:" not in llm_response:
+                        results.append(f"Query {self.query_count}: Could not parse LLM response")
+                        continue
+                    
+                    reasoning = llm_response.split("REASONING:")[1].strip() if "REASONING:" in llm_response else "No reasoning provided"
+                    
+                    # Execute query (or collect the execution started during streaming)
+                    df = df_future.result() if df_future else self.execute_query(conn, sql_part)
+                    result_summary = f"Returned {len(df)} rows, {len(df.columns)} columns"
+                    
+                    # Analyze results
+                    thinking = self.analyze_results(df, sql_part)
+                    
+                    # Keep at most 100 rows of results (first 50 when larger) and convert only those
+                    stored_df = df if len(df) <= 100 else df.head(50)
+                    
+                    # Store query info
+                    query_info = {
+                        "query_num": self.query_count,
+                        "sql": sql_part,
+                        # Computed once so the history view never slices SQL per rerun
+                        "sql_preview": _sql_preview(sql_part),
+                        "reasoning": reasoning,
+                        "result_summary": result_summary,
+                        "thinking": thinking,
+                        "timestamp": datetime.now().isoformat(),
+                        "row_count": len(df),
+                        "column_count": len(df.columns),
+                        "results_data": _df_to_jsonable(stored_df),
+                        "results_truncated": len(df) > 100
+                    }
+                    
+                    self.query_history.append(query_info)
+                    
+                    # Update findings
+                    self.update_findings(thinking)
+                    
+                    # Check if we should trigger summarization
+                    if self.should_trigger_summary():
+                        self.trigger_hierarchical_summary()
+                        results.append(f"✅ Query {self.query_count}: Generated hierarchical summary for queries {self.query_count-2}-{self.query_count}")
+                    else:
+                        results.append(f"✅ Query {self.query_count}: {result_summary}")
+                    
+                except Exception as e:
+                    results.append(f"❌ Query {self.query_count}: {str(e)}")
                     continue
-                
-                sql_part = llm_response.split("SQL:")[1].split("REASONING:")[0].strip()
-                reasoning = llm_response.split("REASONING:")[1].strip() if "REASONING:" in llm_response else "No reasoning provided"
-                
-                # Execute query
-                df = self.execute_query(conn, sql_part)
-                result_summary = f"Returned {len(df)} rows, {len(df.columns)} columns"
-                
-                # Analyze results
-                thinking = self.analyze_results(df, sql_part)
-                
-                # Store query info
-                query_info = {
-                    "query_num": self.query_count,
-                    "sql": sql_part,
-                    "reasoning": reasoning,
-                    "result_summary": result_summary,
-                    "thinking": thinking,
-                    "timestamp": datetime.now().isoformat(),
-                    "row_count": len(df),
-                    "column_count": len(df.columns),
-                    "results_data": df.to_dict('records') if len(df) <= 100 else df.head(50).to_dict('records'),
-                    "results_truncated": len(df) > 100
-                }
-                
-                self.query_history.append(query_info)
-                self.artifacts["query_history"] = copy.deepcopy(self.query_history)
-                
-                # Update findings
-                self.update_findings(thinking)
-                
-                # Check if we should trigger summarization
-                if self.should_trigger_summary():
-                    self.trigger_hierarchical_summary()
-                    results.append(f"✅ Query {self.query_count}: Generated hierarchical summary for queries {self.query_count-2}-{self.query_count}")
-                else:
-                    results.append(f"✅ Query {self.query_count}: {result_summary}")
-                
-            except Exception as e:
-                results.append(f"❌ Query {self.query_count}: {str(e)}")
-                continue
+        
+        # Catch up on batches the in-loop trigger missed so the report covers them
+        deferred_summaries = self.summarize_uncovered_queries()
+        if deferred_summaries:
+            results.append(f"📊 Generated {deferred_summaries} deferred summaries for batches skipped during exploration")
         
         # Generate final report
         final_report = self.generate_final_report()
@@ -658,6 +1098,17 @@ Keep it concise."""
         
         return "\n".join(results)
     
+    def artifacts_version(self) -> tuple:
+        """Cheap fingerprint that changes whenever the artifacts gain data or their metadata is edited"""
+        return (
+            id(self),
+            # Provider and max_queries are updated in place by set_llm_provider / get_datatwin
+            tuple(self.artifacts["session_metadata"].items()),
+            tuple(len(value) for value in self.artifacts.values() if isinstance(value, list)),
+            self.artifacts["schema"].get("timestamp"),
+            self.artifacts["final_report"].get("timestamp")
+        )
+    
     def generate_final_report(self) -> str:
         """Generate final exploration report with artifact capture"""
         # Include summaries in the final report context
@@ -666,7 +1117,7 @@ Keep it concise."""
             summaries_context = f"""
 
 BATCH SUMMARIES GENERATED:
-{json.dumps([f"Batch {i+1} ({s['batch_range']}): {s['summary_content'][:200]}..." for i, s in enumerate(self.artifacts["hierarchical_summaries"])], indent=2)}
+{_jdumps([f"Batch {i+1} ({s['batch_range']}): {s['summary_content'][:200]}..." for i, s in enumerate(self.artifacts["hierarchical_summaries"])])}
 """
         
         report_prompt = f"""Generate a summary report of database exploration.
@@ -679,7 +1130,7 @@ SCHEMA SUMMARY:
 {summaries_context}
 
 KEY FINDINGS:
-{json.dumps(self.findings[:15], indent=2)}
+{_jdumps(self.findings[:15])}
 
 Generate a markdown report with these sections:
 1. Data Structure Overview
@@ -706,35 +1157,25 @@ Make it concise but actionable."""
 
 def initialize_session_state():
     """Initialize session state variables"""
-    if 'exploration_running' not in st.session_state:
-        st.session_state.exploration_running = False
-    if 'exploration_results' not in st.session_state:
-        st.session_state.exploration_results = None
-    if 'llm_provider' not in st.session_state:
-        st.session_state.llm_provider = "anthropic"
-    if 'datatwin' not in st.session_state:
-        st.session_state.datatwin = None
-    if 'schema_introspected' not in st.session_state:
-        st.session_state.schema_introspected = False
-    if 'selected_tables' not in st.session_state:
-        st.session_state.selected_tables = []
+    st.session_state.setdefault('exploration_running', False)
+    st.session_state.setdefault('exploration_results', None)
+    st.session_state.setdefault('llm_provider', "anthropic")
+    st.session_state.setdefault('datatwin', None)
+    st.session_state.setdefault('schema_introspected', False)
+    st.session_state.setdefault('selected_tables', [])
+    st.session_state.setdefault('downloads_prepared', False)
+    st.session_state.setdefault('max_queries', 7)
 
 def load_connection_info():
     """Load connection info from environment"""
-    required_vars = [
+    required_vars = (
         'SNOWFLAKE_ACCOUNT', 'SNOWFLAKE_USERNAME', 
         'SNOWFLAKE_DATABASE', 'SNOWFLAKE_WAREHOUSE', 'SNOWFLAKE_SCHEMA',
-    ]
-    
-    connection_info = {}
-    missing_vars = []
+    )
     
-    for var in required_vars:
-        value = os.getenv(var)
-        if value:
-            connection_info[var] = value
-        else:
-            missing_vars.append(var)
+    values = {var: os.environ.get(var) for var in required_vars}
+    connection_info = {var: value for var, value in values.items() if value}
+    missing_vars = [var for var, value in values.items() if not value]
     
     return connection_info, missing_vars
 
@@ -752,27 +1193,7 @@ def render_sidebar():
         
         st.divider()
         
-        # LLM Provider Selection
-        st.subheader("⚙️ Configuration")
-        provider = st.selectbox(
-            "LLM Provider",
-            ["anthropic", "openai"],
-            index=0 if st.session_state.llm_provider == "anthropic" else 1,
-            help="Choose your preferred LLM provider"
-        )
-        
-        if provider != st.session_state.llm_provider:
-            st.session_state.llm_provider = provider
-            st.session_state.datatwin = None  # Reset on provider change
-        
-        # Max queries setting
-        max_queries = st.slider(
-            "Max Queries", 
-            min_value=3, 
-            max_value=15, 
-            value=7, 
-            help="Maximum number of queries to run"
-        )
+        render_llm_settings()
         
         st.divider()
         
@@ -791,7 +1212,55 @@ def render_sidebar():
                 if 'PASSWORD' not in key:
                     st.text(f"{key}: {value}")
         
-        return connection_info, missing_vars, max_queries
+        return connection_info, missing_vars, st.session_state.max_queries
+
+@st.fragment
+def render_llm_settings():
+    """Render provider and query-budget controls as a fragment so changing them doesn't rerun the results"""
+    # LLM Provider Selection
+    st.subheader("⚙️ Configuration")
+    provider = st.selectbox(
+        "LLM Provider",
+        ["anthropic", "openai"],
+        index=0 if st.session_state.llm_provider == "anthropic" else 1,
+        help="Choose your preferred LLM provider"
+    )
+    
+    # Only switch on explicit confirmation; the introspected schema and artifacts are kept
+    if provider != st.session_state.llm_provider:
+        st.caption(f"Currently using: {st.session_state.llm_provider}")
+        if st.button("Apply Provider Change"):
+            try:
+                if st.session_state.datatwin:
+                    st.session_state.datatwin.set_llm_provider(provider)
+                st.session_state.llm_provider = provider
+                st.rerun()
+            except ValueError as e:
+                st.error(str(e))
+    
+    # Max queries setting; kept in session state since fragment reruns don't return values to the page
+    st.slider(
+        "Max Queries", 
+        min_value=3, 
+        max_value=15, 
+        key="max_queries",
+        help="Maximum number of queries to run"
+    )
+
+@st.cache_resource(show_spinner=False)
+def _pem_to_der(pem: str) -> bytes:
+    """Parse the PEM private key once per process and return its PKCS8 DER bytes"""
+    private_key_obj = serialization.load_pem_private_key(
+        pem.encode(),
+        password=None,
+        backend=default_backend()
+    )
+    
+    return private_key_obj.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
 
 def build_connection_params(connection_info):
     """Build Snowflake connection parameters"""
@@ -800,32 +1269,33 @@ def build_connection_params(connection_info):
         'user': connection_info['SNOWFLAKE_USERNAME'],
         'database': connection_info['SNOWFLAKE_DATABASE'],
         'warehouse': connection_info['SNOWFLAKE_WAREHOUSE'],
-        'schema': connection_info['SNOWFLAKE_SCHEMA']
+        'schema': connection_info['SNOWFLAKE_SCHEMA'],
+        # The connection is cached across reruns; keep the server session from idling out
+        'client_session_keep_alive': True
     }
 
     private_key = os.getenv('NS_PRIVATE_KEY')
     if private_key:
-        from cryptography.hazmat.primitives import serialization
-        from cryptography.hazmat.backends import default_backend
-        
-        private_key_obj = serialization.load_pem_private_key(
-            private_key.encode(),
-            password=None,
-            backend=default_backend()
-        )
-        
-        private_key_bytes = private_key_obj.private_bytes(
-            encoding=serialization.Encoding.DER,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        )
-        
-        conn_params['private_key'] = private_key_bytes
+        conn_params['private_key'] = _pem_to_der(private_key)
     else:
         conn_params['password'] = os.getenv('SNOWFLAKE_PASSWORD', '')
     
     return conn_params
 
+def get_datatwin(max_queries: int) -> StreamlitDataTwin:
+    """Return this session's DataTwin, creating it on first use, with the sidebar's query budget applied"""
+    # Per-session rather than st.cache_resource: the twin holds this session's schema and history,
+    # while its LLM client (and HTTP connection pool) is already shared via get_llm_client
+    datatwin = st.session_state.datatwin
+    if datatwin is None:
+        datatwin = StreamlitDataTwin(
+            llm_provider=st.session_state.llm_provider,
+            max_queries=max_queries
+        )
+    datatwin.max_queries = max_queries
+    datatwin.artifacts["session_metadata"]["max_queries"] = max_queries
+    return datatwin
+
 def render_main_interface(connection_info, missing_vars, max_queries):
     """Render main application interface with table selection"""
     st.title("🔍 DataTwin: Autonomous Data Explorer")
@@ -844,10 +1314,7 @@ def render_main_interface(connection_info, missing_vars, max_queries):
                 with st.spinner("🔄 Discovering database schema..."):
                     try:
                         # Initialize DataTwin for schema introspection only
-                        datatwin = StreamlitDataTwin(
-                            llm_provider=st.session_state.llm_provider,
-                            max_queries=max_queries
-                        )
+                        datatwin = get_datatwin(max_queries)
                         
                         # Connect to database
                         conn_params = build_connection_params(connection_info)
@@ -855,7 +1322,6 @@ def render_main_interface(connection_info, missing_vars, max_queries):
                         
                         # Introspect schema
                         schema = datatwin.introspect_schema(conn)
-                        conn.close()
                         
                         # Store in session state
                         st.session_state.datatwin = datatwin
@@ -875,34 +1341,28 @@ def render_main_interface(connection_info, missing_vars, max_queries):
         st.divider()
         st.subheader("📊 Select Tables for Exploration")
         
-        schema = st.session_state.datatwin.schema
-        all_tables = list(schema["tables"].keys())
+        # Picks up slider changes made after introspection
+        datatwin = get_datatwin(max_queries)
+        schema = datatwin.introspected_schema
+        all_tables = tuple(schema["tables"].keys())
         
         col1, col2, col3 = st.columns([2, 1, 1])
         
         with col1:
             st.write(f"Found {len(all_tables)} tables in the database:")
             
-            # Multi-select for tables
+            # Multi-select for tables, bound directly to session state via its key
             selected_tables = st.multiselect(
                 "Choose tables to explore:",
                 options=all_tables,
-                default=st.session_state.selected_tables,
+                key="selected_tables",
                 help="Select specific tables to focus your exploration"
             )
-            
-            # Update session state
-            st.session_state.selected_tables = selected_tables
         
         with col2:
-            # Quick selection buttons
-            if st.button("Select All"):
-                st.session_state.selected_tables = all_tables
-                st.rerun()
-            
-            if st.button("Clear All"):
-                st.session_state.selected_tables = []
-                st.rerun()
+            # Quick selection buttons; callbacks update state before the rerun, so no st.rerun()
+            st.button("Select All", on_click=lambda: st.session_state.update(selected_tables=list(all_tables)))
+            st.button("Clear All", on_click=lambda: st.session_state.update(selected_tables=[]))
         
         with col3:
             # Show selection stats
@@ -912,72 +1372,270 @@ def render_main_interface(connection_info, missing_vars, max_queries):
         # Show table details for selected tables
         if selected_tables:
             with st.expander(f"📋 Preview Selected Tables ({len(selected_tables)})"):
-                for table_name in selected_tables[:5]:  # Show first 5
-                    table_info = schema["tables"][table_name]
-                    st.write(f"**{table_name}** ({table_info['type']}) - {len(table_info['columns'])} columns")
-                
-                if len(selected_tables) > 5:
-                    st.write(f"... and {len(selected_tables) - 5} more tables")
+                schema_artifact = datatwin.artifacts["schema"]
+                schema_key = (schema_artifact.get("database_used"), schema_artifact.get("schema_used"), schema_artifact.get("timestamp"))
+                st.markdown(_tables_preview_md(tuple(selected_tables[:5]), len(selected_tables), schema_key, schema))
     
     # Step 3: Start Exploration (only show if tables are selected)
     if st.session_state.schema_introspected and st.session_state.selected_tables:
         st.divider()
+        render_exploration_runner(connection_info)
+
+@st.cache_data(ttl=600, max_entries=100, show_spinner=False)
+def _tables_preview_md(names: tuple, selected_count: int, schema_key: tuple, _schema: Dict[str, Any]) -> str:
+    """Markdown preview of the first selected tables, rendered with a single st.markdown call"""
+    lines = [
+        f"**{name}** ({_schema['tables'][name]['type']}) - {len(_schema['tables'][name]['columns'])} columns"
+        for name in names
+    ]
+    if selected_count > len(names):
+        lines.append(f"... and {selected_count - len(names)} more tables")
+    return "\n\n".join(lines)
+
+def filter_schema(schema: Dict[str, Any], selected_tables: List[str]) -> Dict[str, Any]:
+    """Restrict a schema to the selected tables and the relationships between them"""
+    selected = frozenset(selected_tables)
+    # Inferred relationship targets are lowercased, so match them case-insensitively
+    selected_lower = frozenset(table.lower() for table in selected)
+    # Single pass over the selection, one hash lookup per selected table
+    tables = schema["tables"]
+    return {
+        "tables": {
+            table: columns
+            for table in selected_tables if (columns := tables.get(table)) is not None
+        },
+        "relationships": [
+            rel for rel in schema.get("relationships", [])
+            if rel["source_table"] in selected
+            and rel["target_table"].lower() in selected_lower
+        ]
+    }
+
+def get_filtered_schema(datatwin, selected_tables: List[str]) -> Dict[str, Any]:
+    """Filtered schema for the current selection, recomputed only when the selection changes"""
+    return session_memo(
+        "filtered_schema",
+        (id(datatwin), frozenset(selected_tables)),
+        lambda: filter_schema(datatwin.introspected_schema, selected_tables)
+    )
+
+@st.fragment
+def render_exploration_runner(connection_info):
+    """Render exploration controls as a fragment so they rerun without the rest of the page"""
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        if st.button(
+            f"🚀 Start Exploration ({len(st.session_state.selected_tables)} tables)",
+            disabled=st.session_state.exploration_running,
+            type="primary"
+        ):
+            st.session_state.exploration_running = True
+            completed = False
+            
+            with st.status("🔄 Exploring selected tables...") as status:
+                try:
+                    # Use existing datatwin (with the current query budget) but restrict its schema to the selected tables
+                    datatwin = get_datatwin(st.session_state.max_queries)
+                    datatwin.schema = get_filtered_schema(datatwin, st.session_state.selected_tables)
+                    
+                    # Connect and run exploration
+                    status.write("🔗 Connecting to Snowflake...")
+                    conn_params = build_connection_params(connection_info)
+                    conn = datatwin.connect_snowflake(conn_params)
+                    
+                    status.write(f"🔍 Running up to {datatwin.max_queries} queries...")
+                    results = datatwin.run_exploration(conn)
+                    
+                    # Store results
+                    st.session_state.exploration_results = results
+                    
+                    status.update(label="✅ Exploration completed!", state="complete")
+                    completed = True
+                    
+                except Exception as e:
+                    status.update(label=f"❌ Exploration failed: {str(e)}", state="error")
+                finally:
+                    st.session_state.exploration_running = False
+            
+            if completed:
+                # Results live outside this fragment, so refresh the whole page once
+                st.rerun()
+        
+        if st.session_state.exploration_results:
+            with st.expander("✅ Exploration completed - run log"):
+                st.markdown(st.session_state.exploration_results)
+    
+    with col2:
+        if st.session_state.datatwin:
+            st.metric(
+                "Queries Run", 
+                len(st.session_state.datatwin.query_history),
+                help="Total SQL queries executed"
+            )
+
+def session_memo(name: str, version, build):
+    """Per-session memo: return the stored value for name, rebuilding it when version changes"""
+    # Kept in session_state rather than st.cache_data: these values are per-session data
+    memo = st.session_state.setdefault("session_memo", {})
+    cached = memo.get(name)
+    if cached is None or cached[0] != version:
+        cached = (version, build())
+        memo[name] = cached
+    return cached[1]
+
+def cached_json_payload(name: str, obj, version) -> bytes:
+    """Serialize a download payload once per artifacts version and reuse it on later reruns"""
+    # Bytes go to st.download_button as-is, skipping a decode and Streamlit's re-encode
+    return session_memo(f"json_payload:{name}", version, lambda: _jdumps_bytes(obj))
+
+@st.fragment
+def _render_report_view(datatwin):
+    """Render the final exploration report"""
+    st.subheader("📋 Exploration Report")
+    if datatwin.artifacts.get("final_report", {}).get("report_content"):
+        st.markdown(datatwin.artifacts["final_report"]["report_content"])
+    else:
+        st.info("Report will be generated after exploration completes")
+
+@st.fragment
+def _render_queries_view(datatwin):
+    """Render the query history table and the selected query's details"""
+    st.subheader("🔍 Query History")
+    if datatwin.query_history:
+        # One table for the whole history; details render for the selected row only
+        history_df = session_memo(
+            "query_history_df",
+            (id(datatwin), len(datatwin.query_history)),
+            lambda: pd.DataFrame([
+                {"Query": q["query_num"], "SQL": q.get("sql_preview") or q["sql"][:80], "Results": q["result_summary"]}
+                for q in datatwin.query_history
+            ])
+        )
+        event = st.dataframe(
+            history_df,
+            hide_index=True,
+            width='stretch',
+            on_select="rerun",
+            selection_mode="single-row",
+            key="query_history_table"
+        )
         
-        col1, col2 = st.columns([2, 1])
+        if event.selection.rows:
+            query = datatwin.query_history[event.selection.rows[0]]
+            st.markdown(f"**Query {query['query_num']}**")
+            st.code(query['sql'], language='sql')
+            st.write("**Reasoning:**", query.get('reasoning', 'N/A'))
+            st.write("**Results:**", query['result_summary'])
+            if query.get('thinking'):
+                st.write("**Analysis:**")
+                st.write(query['thinking'])
+        else:
+            st.caption("Select a query to see its SQL, reasoning and analysis")
+
+@st.fragment
+def _render_summaries_view(datatwin):
+    """Render the hierarchical batch summaries"""
+    st.subheader("📊 Hierarchical Summaries")
+    summaries = datatwin.artifacts.get('hierarchical_summaries', [])
+    
+    if summaries:
+        st.info(f"Generated {len(summaries)} batch summaries during exploration")
         
-        with col1:
-            if st.button(
-                f"🚀 Start Exploration ({len(st.session_state.selected_tables)} tables)",
-                disabled=st.session_state.exploration_running,
-                type="primary"
-            ):
-                st.session_state.exploration_running = True
+        for i, summary in enumerate(summaries):
+            with st.expander(f"📊 Summary {i+1}: {summary['batch_range']} ({summary['query_count']} queries)"):
+                st.markdown(summary['summary_content'])
+                st.caption(f"Generated: {summary['timestamp']}")
                 
-                with st.spinner("🔄 Exploring selected tables..."):
-                    try:
-                        # Use existing datatwin but filter schema to selected tables
-                        datatwin = st.session_state.datatwin
-                        
-                        # Filter schema to selected tables only
-                        filtered_schema = {
-                            "tables": {
-                                table: datatwin.schema["tables"][table] 
-                                for table in st.session_state.selected_tables
-                            },
-                            "relationships": [
-                                rel for rel in datatwin.schema.get("relationships", [])
-                                if rel["source_table"] in st.session_state.selected_tables
-                                and rel["target_table"] in st.session_state.selected_tables
-                            ]
-                        }
-                        
-                        # Update the datatwin's schema
-                        datatwin.schema = filtered_schema
-                        
-                        # Connect and run exploration
-                        conn_params = build_connection_params(connection_info)
-                        conn = datatwin.connect_snowflake(conn_params)
-                        
-                        results = datatwin.run_exploration(conn)
-                        conn.close()
-                        
-                        # Store results
-                        st.session_state.exploration_results = results
-                        
-                        st.success("✅ Exploration completed!")
-                        
-                    except Exception as e:
-                        st.error(f"❌ Exploration failed: {str(e)}")
-                    finally:
-                        st.session_state.exploration_running = False
+                # Show which queries were summarized
+                if 'queries_summarized' in summary:
+                    st.write("**Queries summarized:**", ", ".join(map(str, summary['queries_summarized'])))
+    else:
+        st.info("Summaries will appear after 3+ queries are executed")
+        st.write("The system generates hierarchical summaries every 3 queries to maintain context efficiency.")
+
+@st.fragment
+def _render_schema_view(datatwin):
+    """Render the explored schema, one expander per table"""
+    st.subheader("🏗️ Database Schema")
+    if datatwin.schema:
+        # Built once per introspection and table selection; later reruns reuse the same frames
+        tables = datatwin.schema["tables"]
+        column_frames = session_memo(
+            "schema_column_frames",
+            (id(datatwin), datatwin.artifacts["schema"].get("timestamp"), tuple(tables)),
+            lambda: {name: pd.DataFrame(info["columns"]) for name, info in tables.items()}
+        )
+        for table_name, table_info in tables.items():
+            with st.expander(f"📊 {table_name} ({table_info['type']})", expanded=False):
+                st.dataframe(column_frames[table_name], width='stretch')
+    else:
+        st.info("Schema information will appear here")
+
+@st.fragment
+def _render_downloads_view(datatwin):
+    """Render report and JSON download buttons"""
+    st.subheader("⬇️ Download Results")
+    
+    if datatwin.artifacts:
+        version = datatwin.artifacts_version()
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.download_button(
+                "📄 Complete Report",
+                datatwin.artifacts["final_report"].get("report_content", ""),
+                "datatwin_report.md",
+                "text/markdown"
+            )
+        
+        # JSON payloads are only built once requested, then reused until the artifacts change
+        if not st.session_state.downloads_prepared:
+            with col2:
+                if st.button("📦 Prepare JSON Downloads", help="Serialize query history, artifacts and summaries"):
+                    st.session_state.downloads_prepared = True
+                    st.rerun(scope="fragment")
+            return
         
         with col2:
-            if st.session_state.datatwin:
-                st.metric(
-                    "Queries Run", 
-                    len(st.session_state.datatwin.query_history),
-                    help="Total SQL queries executed"
+            query_history_json = cached_json_payload("query_history", datatwin.query_history, version)
+            st.download_button(
+                "🔍 Query History", 
+                query_history_json,
+                "datatwin_queries.json",
+                "application/json"
+            )
+        
+        with col3:
+            artifacts_json = cached_json_payload("artifacts", datatwin.artifacts, version)
+            st.download_button(
+                "🗃️ Complete Artifacts",
+                artifacts_json,
+                "datatwin_artifacts.json", 
+                "application/json"
+            )
+        
+        # Summaries download
+        with col4:
+            summaries = datatwin.artifacts.get('hierarchical_summaries', [])
+            if summaries:
+                summaries_json = cached_json_payload("summaries", summaries, version)
+                st.download_button(
+                    "📊 Summaries Only",
+                    summaries_json,
+                    "datatwin_summaries.json",
+                    "application/json"
                 )
+            else:
+                st.button("📊 No Summaries", disabled=True)
+
+RESULT_VIEWS = {
+    "📋 Report": _render_report_view,
+    "🔍 Queries": _render_queries_view,
+    "📊 Summaries": _render_summaries_view,
+    "🏗️ Schema": _render_schema_view,
+    "⬇️ Downloads": _render_downloads_view,
+}
 
 def render_results():
     """Render exploration results with enhanced summaries display"""
@@ -987,111 +1645,16 @@ def render_results():
     
     datatwin = st.session_state.datatwin
     
-    # Enhanced tabs with summaries
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "📋 Report", 
-        "🔍 Queries", 
-        "📊 Summaries",
-        "🏗️ Schema", 
-        "⬇️ Downloads"
-    ])
-    
-    with tab1:
-        st.subheader("📋 Exploration Report")
-        if datatwin.artifacts.get("final_report", {}).get("report_content"):
-            st.markdown(datatwin.artifacts["final_report"]["report_content"])
-        else:
-            st.info("Report will be generated after exploration completes")
-    
-    with tab2:
-        st.subheader("🔍 Query History")
-        for i, query in enumerate(datatwin.query_history):
-            with st.expander(f"Query {query['query_num']}: {query['sql'][:50]}..."):
-                st.code(query['sql'], language='sql')
-                st.write("**Reasoning:**", query.get('reasoning', 'N/A'))
-                st.write("**Results:**", query['result_summary'])
-                if query.get('thinking'):
-                    st.write("**Analysis:**")
-                    st.write(query['thinking'])
-    
-    # Summaries Tab
-    with tab3:
-        st.subheader("📊 Hierarchical Summaries")
-        summaries = datatwin.artifacts.get('hierarchical_summaries', [])
-        
-        if summaries:
-            st.info(f"Generated {len(summaries)} batch summaries during exploration")
-            
-            for i, summary in enumerate(summaries):
-                with st.expander(f"📊 Summary {i+1}: {summary['batch_range']} ({summary['query_count']} queries)"):
-                    st.markdown(summary['summary_content'])
-                    st.caption(f"Generated: {summary['timestamp']}")
-                    
-                    # Show which queries were summarized
-                    if 'queries_summarized' in summary:
-                        st.write("**Queries summarized:**", ", ".join(map(str, summary['queries_summarized'])))
-        else:
-            st.info("Summaries will appear after 3+ queries are executed")
-            st.write("The system generates hierarchical summaries every 3 queries to maintain context efficiency.")
-    
-    with tab4:
-        st.subheader("🏗️ Database Schema")
-        if datatwin.schema:
-            for table_name, table_info in datatwin.schema["tables"].items():
-                with st.expander(f"📊 {table_name} ({table_info['type']})"):
-                    columns_df = pd.DataFrame(table_info["columns"])
-                    st.dataframe(columns_df, width='stretch')
-        else:
-            st.info("Schema information will appear here")
-    
-    with tab5:
-        st.subheader("⬇️ Download Results")
-        
-        if datatwin.artifacts:
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.download_button(
-                    "📄 Complete Report",
-                    datatwin.artifacts["final_report"].get("report_content", ""),
-                    "datatwin_report.md",
-                    "text/markdown"
-                )
-            
-            with col2:
-                # Fix: Use convert_decimals to handle Timestamp objects
-                query_history_json = json.dumps(convert_decimals(datatwin.query_history), indent=2)
-                st.download_button(
-                    "🔍 Query History", 
-                    query_history_json,
-                    "datatwin_queries.json",
-                    "application/json"
-                )
-            
-            with col3:
-                # Fix: Use convert_decimals to handle all artifacts
-                artifacts_json = json.dumps(convert_decimals(datatwin.artifacts), indent=2)
-                st.download_button(
-                    "🗃️ Complete Artifacts",
-                    artifacts_json,
-                    "datatwin_artifacts.json", 
-                    "application/json"
-                )
-            
-            # Summaries download
-            with col4:
-                summaries = datatwin.artifacts.get('hierarchical_summaries', [])
-                if summaries:
-                    # Fix: Use convert_decimals for summaries too
-                    summaries_json = json.dumps(convert_decimals(summaries), indent=2)
-                    st.download_button(
-                        "📊 Summaries Only",
-                        summaries_json,
-                        "datatwin_summaries.json",
-                        "application/json"
-                    )
-                else:
-                    st.button("📊 No Summaries", disabled=True)
+    # A radio instead of st.tabs: tabs execute every body on each rerun, this renders only the active view.
+    # Each view is a fragment, so its own widgets (row selection, download prep) rerun just that view
+    active_view = st.radio(
+        "View",
+        list(RESULT_VIEWS),
+        horizontal=True,
+        key="active_tab",
+        label_visibility="collapsed"
+    )
+    RESULT_VIEWS[active_view](datatwin)
 
 def main():
     """Main application entry point"""